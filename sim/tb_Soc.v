@@ -181,6 +181,58 @@ module tb_Soc;
     end
 `endif
 
+`ifdef TB_TRACE
+    // Retired-instruction trace for tools/tracecmp.py (needs TB_USE_INTERNALS paths).
+    // One line per event, all values hex:
+    //   TRACE <cycle> pc=XXXX insn=XXXX [rf=R:VVVV] [mw=AAAA:VVVV | mb=AAAA:VVVV]
+    //   TRACE <cycle> irq=VVVV
+    //   TRACE <cycle> stall
+    wire        tr_insn_ce   = dut.insn_ce;
+    // The irq_take-cycle instruction still executes (rf/cc/store strobes are not
+    // gated, and the return address is the next word), so retire on exec_ce.
+    wire        tr_retire    = dut.u_irq_cpu.u_cpu.exec_ce;
+    // irq_save cycle: insn_q is the shadow word after the taken instruction; it
+    // only writes r14 and runs again after the return, so it is not logged.
+    wire        tr_irq_save  = dut.u_irq_cpu.u_cpu.irq_save;
+    wire [15:0] tr_insn      = dut.insn_q;
+    wire        tr_rf_we     = dut.u_irq_cpu.u_cpu.dp.rf_we_final;
+    wire [3:0]  tr_rf_ad     = dut.u_irq_cpu.u_cpu.dp.rf_wr_ad_final;
+    wire [15:0] tr_rf_d      = dut.u_irq_cpu.u_cpu.dp.regfile_din;
+
+    // insn_q address: pc sampled on the same edge insn_q is loaded
+    reg  [15:0] tr_pc;
+    reg         tr_annul;   // slot killed by a taken branch (NOP injected)
+    always @(posedge clk) begin
+        if (rst) begin
+            tr_pc    <= 16'h0000;
+            tr_annul <= 1'b1;
+        end else if (tr_insn_ce) begin
+            tr_pc    <= dut.u_irq_cpu.u_cpu.dp.pc;
+            tr_annul <= dut.br_taken;
+        end
+    end
+
+    always @(posedge clk) begin
+        if (!rst) begin
+            if (!tr_insn_ce && !irq_take) begin
+                $display("TRACE %0d stall", cycles);
+            end else if (tr_retire && !tr_annul && !tr_irq_save) begin
+                $write("TRACE %0d pc=%04h insn=%04h", cycles, tr_pc, tr_insn);
+                if (tr_rf_we && tr_rf_ad != 4'h0)
+                    $write(" rf=%1h:%04h", tr_rf_ad, tr_rf_d);
+                if (dut.sw)
+                    $write(" mw=%04h:%04h", d_ad, dut.cpu_do);
+                else if (dut.sb)
+                    $write(" mb=%04h:%04h", d_ad, dut.cpu_do);
+                $write("\n");
+            end
+            // after the instruction of the same cycle, which completes first
+            if (irq_take)
+                $display("TRACE %0d irq=%04h", cycles, irq_vector);
+        end
+    end
+`endif
+
     // Text monitoring
     initial begin
 `ifdef TB_USE_INTERNALS
@@ -330,6 +330,410 @@ def expand_macros(lines):
     return out_lines
 
 
+# ------------- .isr: minimal interrupt prologue / epilogue -------------
+#
+#   .isr NAME, VEC [, EXIT]
+#       ... handler body ...
+#   .endisr
+#
+# Places a jump to NAME_body at .org VEC (labelled NAME) and moves the
+# handler out of line, after the last source line, wrapped in a
+# prologue/epilogue that saves exactly the registers (and condition codes)
+# the handler and its callees may write. The epilogue is also labelled
+# NAME_exit for early exits; it ends in `STI` + `JAL r14, r14, #0` (the word
+# iret_detected matches), or branches to the interrupt return stub EXIT
+# when one is given.
+#
+# Runs after macro expansion, so the body is plain instructions.
+
+isr_re    = re.compile(r"^\.isr\b\s*(.*)$", re.IGNORECASE)
+imm_hi_re = re.compile(r"^#?\s*([A-Za-z_]\w*)\s*>>\s*4$")
+
+ISR_SCRATCH = ("t0", "t1", "t2", "t3", "a0", "a1", "a2",
+               "s0", "s1", "s2", "s3", "fp", "gp", "lr")
+# every register a full context save covers (r0 is constant, sp is kept balanced)
+ISR_FULL = frozenset(range(1, 16)) - {ABI_REGS["sp"]}
+
+# flag writers: SUM/CMP ALU ops (RR and RI share fn codes) and ADDI
+CC_FN = {"ADD", "SUB", "ADC", "SBC", "CMP", "RSUBI", "ADCI", "RSCBI", "RCMPI", "ADDI"}
+
+# register number -> first ABI name (a0 over v0)
+_REG_NAMES = {num: name for name, num in reversed(ABI_REGS.items())}
+
+
+class IsrInfo:
+    """Result of one .isr block, for the assembler summary."""
+
+    def __init__(self, name, vec_expr, exit_target, line_no):
+        self.name = name
+        self.vec_expr = vec_expr
+        self.exit_target = exit_target
+        self.line_no = line_no
+        self.vector = None      # byte address, once pass 1 has run
+        self.saved = []         # register numbers, save order
+        self.save_cc = False
+        self.nested = False     # STI reachable: epilogue needs CLI, lr is saved
+        self.long_exit = False  # J instead of BR to the exit stub (EXIT given)
+        self.long_entry = False  # J instead of BR from the vector to NAME_body
+        self.unknown = None     # line of an indirect jump, if any
+        self.cycles = 0
+        self.full_cycles = 0
+
+
+def _split_line(raw):
+    """`lbl: MNEM a, b ; c` -> (labels, MNEM upper or directive, operands)."""
+    text = raw.split("//", 1)[0].split(";", 1)[0].strip()
+    labels = []
+    while True:
+        m = label_re.match(text)
+        if not m:
+            break
+        labels.append(m.group(1))
+        text = m.group(2).strip()
+    if not text:
+        return labels, None, []
+    fields = text.split(None, 1)
+    ops = [op.strip() for op in fields[1].split(",") if op.strip()] if len(fields) > 1 else []
+    return labels, fields[0].upper(), ops
+
+
+def _insn_defs(mnem, ops):
+    """(registers written, flags written) for one instruction."""
+    if mnem in FN or mnem in RI:
+        regs = set() if mnem in ("CMP", "RCMPI") else {parse_reg(ops[0])}
+        return regs, mnem in CC_FN
+    if mnem in ("ADDI", "LW", "LB", "JAL", "GETCC"):
+        return {parse_reg(ops[0])}, mnem == "ADDI"
+    return set(), mnem == "SETCC"
+
+
+def _isr_flow(insns, labels):
+    """
+    Successor rules for the handler walk. Returns a function
+    idx -> (kind, targets): kind is "next", "call", "ret", "iret",
+    "exit" or "unknown"; targets are instruction indices.
+    """
+    def target_of(op, i):
+        m = re.match(r"^([A-Za-z_]\w*)$", op)
+        if m:
+            return labels.get(m.group(1))
+        try:
+            return i + 1 + parse_imm(op)
+        except ValueError:
+            return None
+
+    def flow(i):
+        mnem, ops, _, _ = insns[i]
+        if mnem == ".ENDISR":
+            return "exit", []
+        if mnem in BR_COND:
+            t = target_of(ops[0], i) if len(ops) == 1 else None
+            if t is None:
+                return "unknown", []
+            return "next", [t] if mnem == "BR" else [t, i + 1]
+        if mnem == "JAL":
+            rd, rs = parse_reg(ops[0]), parse_reg(ops[1])
+            lr = ABI_REGS["lr"]
+            if rd == lr and rs == lr:
+                return "iret", []
+            prev = insns[i - 1] if i else None
+            if rs == 0 and prev is not None and prev[0] == "IMM" and prev[1]:
+                m = imm_hi_re.match(prev[1][0])
+                t = labels.get(m.group(1)) if m else None
+                if t is None:
+                    return "unknown", []
+                return ("next", [t]) if rd == 0 else ("call", [t, i + 1])
+            if rs == lr and rd == 0:
+                return "ret", []
+            return "unknown", []
+        if mnem == ".WORD":
+            return "unknown", []
+        return "next", [i + 1]
+
+    return flow
+
+
+def _analyze_isr(info, start, insns, flow):
+    """
+    Walk the handler from `start` and every function it calls, collecting
+    written registers / flags. At interrupt entry every register is live
+    in the interrupted code, so anything written must be saved. A return
+    or iret reached from the handler body itself (not from a callee)
+    would skip the epilogue and is rejected.
+    """
+    regs, cc, nested = set(), False, False
+    seen = set()
+    work = [(start, True)]
+    while work:
+        i, in_body = work.pop()
+        if (i, in_body) in seen or not 0 <= i < len(insns):
+            continue
+        seen.add((i, in_body))
+        mnem, ops, line_no, raw = insns[i]
+        try:
+            kind, targets = flow(i)
+            if kind == "unknown":
+                info.unknown = line_no
+                return set(ISR_FULL), True, True, True
+            if not mnem.startswith("."):
+                r, c = _insn_defs(mnem, ops)
+                regs |= r
+                cc |= c
+        except (ValueError, IndexError):
+            _context_error(f".isr {info.name}: cannot analyze '{mnem}'", line_no, raw)
+        nested |= mnem == "STI"
+        if kind in ("ret", "iret") and in_body:
+            _context_error(
+                f".isr {info.name}: handler returns without passing its epilogue "
+                f"(fall through to .endisr or branch to {info.name}_exit)", line_no, raw)
+        if kind == "call":
+            work.append((targets[0], False))
+            work.append((targets[1], in_body))
+        else:
+            work.extend((t, in_body) for t in targets)
+    if nested:
+        regs.add(ABI_REGS["lr"])    # a nested interrupt overwrites r14
+    sp_written = ABI_REGS["sp"] in regs
+    regs.discard(0)
+    regs.discard(ABI_REGS["sp"])
+    return regs, cc, nested, sp_written
+
+
+def _sp_adjust(delta):
+    """ADDI sp, sp, #delta (IMM-prefixed outside -8..7)."""
+    if -8 <= delta <= 7:
+        return [f"ADDI  sp, sp, #{delta}"]
+    v = delta & 0xFFFF
+    return [f"IMM   #0x{v >> 4:03X}", f"ADDI  sp, sp, #0x{v & 0xF:X}"]
+
+
+def _slot_imm(k):
+    """
+    imm4 for word offset 2*k from sp. LW/SW rotate the nibble
+    ({imm[0], imm[3:1], 0}), so unprefixed offsets are 0,2,..,14 (even
+    nibbles) and 16,18,..,30 (odd nibbles).
+    """
+    return 2 * k if k < 8 else 2 * (k - 8) + 1
+
+
+def _isr_frame(regs, cc, nested, exit_target, long_exit, move_sp):
+    """
+    Prologue and epilogue lines for a save set. Returns (pro, epi, saved,
+    save_cc).
+
+    move_sp=False keeps sp where it is and saves below it with IMM-prefixed
+    negative offsets; only valid while nothing else can write there (no
+    sp writes, no STI). move_sp=True allocates a frame with ADDI; slots
+    are 2 words apart so each save is one unprefixed SW. That ADDI writes
+    the condition codes, so a moved frame always saves them.
+
+    With condition codes, a scratch register is first stored at sp-1
+    (gie is still clear from irq_take) so GETCC runs before anything that
+    writes the flags, and SETCC runs after the last ADDI.
+
+    exit_target None returns inline: STI directly before the iret word
+    leaves a single interruptible slot while r14 holds the only copy of the
+    return address, against three (BR, its annulled slot, the stub) when
+    branching to a shared stub.
+    """
+    order = [r for r in (ABI_REGS[n] for n in ISR_SCRATCH) if r in regs]
+    save_cc = cc or (move_sp and bool(order))
+    pro, epi = [], []
+    if nested:
+        epi.append("CLI")
+    scratch = x = None
+    if save_cc:
+        scratch = order[0] if order else ABI_REGS["t0"]
+        order = [r for r in order if r != scratch]
+        x = _REG_NAMES[scratch]
+        pro += ["IMM   #0xFFF", f"SW    {x}, sp, #0xF", f"GETCC {x}"]
+    slots = order + ([None] if save_cc else [])     # None: condition codes
+
+    if move_sp:
+        frame = 2 * len(slots) + 1 if save_cc else 2 * len(slots) - 1
+        if frame > 0:
+            pro += _sp_adjust(-frame)
+        for k, r in enumerate(slots):
+            name = x if r is None else _REG_NAMES[r]
+            pro.append(f"SW    {name}, sp, #{_slot_imm(k)}")
+            epi.append(f"LW    {name}, sp, #{_slot_imm(k)}")
+        if frame > 0:
+            epi += _sp_adjust(frame)
+    else:
+        # sp-1 holds the scratch register when condition codes are saved
+        base = 2 if save_cc else 1
+        for k, r in enumerate(slots):
+            name = x if r is None else _REG_NAMES[r]
+            pro += ["IMM   #0xFFF", f"SW    {name}, sp, #0x{-(base + k) & 0xF:X}"]
+            epi += ["IMM   #0xFFF", f"LW    {name}, sp, #0x{-(base + k) & 0xF:X}"]
+
+    if save_cc:
+        epi += [f"SETCC {x}", "IMM   #0xFFF", f"LW    {x}, sp, #0xF"]
+    epi.append("STI")
+    if exit_target is None:
+        epi.append("JAL   r14, r14, #0")
+    elif long_exit:
+        epi += [f"IMM   {exit_target} >> 4", f"JAL   r0, r0, {exit_target} & 0xF"]
+    else:
+        epi.append(f"BR    {exit_target}")
+
+    saved = ([scratch] if save_cc else []) + order
+    return pro, epi, saved, save_cc
+
+
+def _isr_cycles(pro, epi, via_stub, long_entry):
+    """
+    Entry+exit cycles: the vector's jump to the body (BR, or IMM + JAL)
+    and its annulled slot, one per instruction, one more per LW/LB
+    (mem_rdy stalls every load a cycle), one for the slot annulled by the
+    taken exit jump, and the stub's JAL plus its annulled slot when exiting
+    through a stub.
+    """
+    loads = sum(1 for ln in pro + epi if ln.startswith(("LW", "LB")))
+    entry = 3 if long_entry else 2
+    return entry + len(pro) + len(epi) + loads + 1 + (2 if via_stub else 0)
+
+
+def expand_isrs(lines):
+    """
+    Replace `.isr NAME, VEC [, EXIT]` ... `.endisr` blocks with a jump at
+    VEC to the handler, which is wrapped in a minimal prologue/epilogue and
+    appended after the last line. Returns (lines, isrs) where isrs is a
+    list of IsrInfo in source order.
+    """
+    if not any(".isr" in ln.lower() for ln in lines):
+        return lines, []
+
+    # instruction stream over the whole program, .endisr as a pseudo-insn
+    insns = []          # (MNEM, operands, line_no, raw)
+    labels = {}         # label -> index into insns
+    blocks = []         # (IsrInfo, body start index, first line, last line)
+    cur = None
+    for line_no, raw in enumerate(lines, start=1):
+        lbls, mnem, ops = _split_line(raw)
+        text = raw.split("//", 1)[0].split(";", 1)[0].strip()
+        if mnem == ".ISR":
+            if cur is not None:
+                _context_error(".isr blocks cannot nest", line_no, raw)
+            if lbls:
+                _context_error(".isr line cannot carry a label", line_no, raw)
+            args = [a.strip() for a in isr_re.match(text).group(1).split(",") if a.strip()]
+            if len(args) not in (2, 3) or not re.match(r"^[A-Za-z_]\w*$", args[0]):
+                _context_error(".isr requires NAME, VEC [, EXIT]", line_no, raw)
+            exit_target = args[2] if len(args) == 3 else None
+            cur = (IsrInfo(args[0], args[1], exit_target, line_no), len(insns), line_no)
+            labels[args[0]] = len(insns)
+            continue
+        for lbl in lbls:
+            labels[lbl] = len(insns)
+        if mnem == ".ENDISR":
+            if cur is None:
+                _context_error(".endisr without .isr", line_no, raw)
+            if lbls:
+                _context_error(f".endisr line cannot carry a label (use {cur[0].name}_exit)",
+                               line_no, raw)
+            labels[f"{cur[0].name}_exit"] = len(insns)
+            insns.append((mnem, ops, line_no, raw))
+            blocks.append(cur + (line_no,))
+            cur = None
+            continue
+        if mnem is None or mnem in (".EQU", ".ORG", ".INCLUDE"):
+            continue
+        insns.append((mnem, ops, line_no, raw))
+    if cur is not None:
+        _context_error(f"unterminated .isr {cur[0].name}", cur[2], lines[cur[2] - 1])
+    if not blocks:
+        return lines, []
+
+    flow = _isr_flow(insns, labels)
+    frames = {}
+    for info, start, _, _ in blocks:
+        regs, cc, nested, sp_written = _analyze_isr(info, start, insns, flow)
+        move_sp = True
+        if not (nested or sp_written):
+            # nothing else writes below sp: keep whichever frame is cheaper
+            below = _isr_frame(regs, cc, nested, info.exit_target, False, False)
+            moved = _isr_frame(regs, cc, nested, info.exit_target, False, True)
+            via_stub = info.exit_target is not None
+            move_sp = (_isr_cycles(*moved[:2], via_stub, False)
+                       < _isr_cycles(*below[:2], via_stub, False))
+        frames[info.name] = (regs, cc, nested, move_sp)
+
+    def render():
+        out, bodies, entry_lines, exit_lines, pos = [], [], {}, {}, 0
+        for info, _, first, last in blocks:
+            out += lines[pos:first - 1]
+            body = f"{info.name}_body"
+            out += [f".org {info.vec_expr}", f"{info.name}:"]
+            if info.long_entry:
+                out += [f"    IMM   {body} >> 4", f"    JAL   r0, r0, {body} & 0xF"]
+            else:
+                out.append(f"    BR    {body}")
+            entry_lines[info.name] = len(out)    # 1-based line of the entry jump
+            pro, epi, _, _ = _isr_frame(*frames[info.name][:3], info.exit_target,
+                                        info.long_exit, frames[info.name][3])
+            bodies.append((info.name, [f"{body}:"] + [f"    {ln}" for ln in pro]
+                           + lines[first:last - 1] + [f"{info.name}_exit:"]
+                           + [f"    {ln}" for ln in epi]))
+            pos = last
+        out += lines[pos:]
+        # out of line: vectors are only 16 words apart
+        for name, body in bodies:
+            out += body
+            exit_lines[name] = len(out)          # 1-based line of the exit insn
+        return out, entry_lines, exit_lines
+
+    # branch relaxation: BR to the body / stub unless it is out of range
+    while True:
+        out, entry_lines, exit_lines = render()
+        symbols, sym_kind, cooked = first_pass(out)
+        changed = False
+        for info, _, _, _ in blocks:
+            if not info.long_entry:
+                pc = cooked[entry_lines[info.name] - 1][0]
+                disp = (symbols[f"{info.name}_body"] - (pc * 2 + 2)) // 2
+                if not -128 <= disp <= 127:
+                    info.long_entry = changed = True
+            if info.long_exit or info.exit_target is None:
+                continue
+            if sym_kind.get(info.exit_target) != "label":
+                if info.exit_target not in symbols:
+                    _context_error(f".isr {info.name}: exit target '{info.exit_target}' "
+                                   "is not defined", info.line_no, lines[info.line_no - 1])
+                info.long_exit = changed = True
+                continue
+            pc = cooked[exit_lines[info.name] - 1][0]
+            disp = (symbols[info.exit_target] - (pc * 2 + 2)) // 2
+            if not -128 <= disp <= 127:
+                info.long_exit = changed = True
+        if not changed:
+            break
+
+    # an entry jump past the next .org would only fail in pass 2, on that line
+    for info, _, _, _ in blocks:
+        line = entry_lines[info.name]
+        end = cooked[line - 1][0] + 1
+        for pc, text, _, _ in cooked[line:]:
+            if text is not None and text.lower().startswith(".org"):
+                if pc < end:
+                    _context_error(f".isr {info.name}: vector jump at 0x{symbols[info.name]:04X} "
+                                   f"runs past the next .org (0x{pc * 2:04X})",
+                                   info.line_no, lines[info.line_no - 1])
+                break
+
+    for info, _, _, _ in blocks:
+        regs, cc, nested, move_sp = frames[info.name]
+        pro, epi, info.saved, info.save_cc = _isr_frame(
+            regs, cc, nested, info.exit_target, info.long_exit, move_sp)
+        info.nested = nested
+        via_stub = info.exit_target is not None
+        info.cycles = _isr_cycles(pro, epi, via_stub, info.long_entry)
+        pro, epi, _, _ = _isr_frame(ISR_FULL, True, nested, info.exit_target, info.long_exit, True)
+        info.full_cycles = _isr_cycles(pro, epi, via_stub, info.long_entry)
+        info.vector = symbols.get(info.name)
+    return out, [info for info, _, _, _ in blocks]
+
+
 # ------------- instruction encoder (pass 2) -------------
 
 def assemble_line(asm: str, pc_words: int, symbols=None, sym_kind=None) -> int:
@@ -708,6 +1112,9 @@ def main():
     # 3, Expand macros 
     lines = expand_macros(lines_with_includes)
 
+    # 4. Generate .isr prologues / epilogues
+    lines, isrs = expand_isrs(lines)
+
     symbols, sym_kind, cooked = first_pass(lines)
     words = second_pass(cooked, symbols, sym_kind)
 
@@ -725,6 +1132,12 @@ def main():
         print(f"  combined: {out_path}")
         print(f"  hi bytes: {hi_path}")
         print(f"  lo bytes: {lo_path}")
+        for info in isrs:
+            saves = [_REG_NAMES[r] for r in info.saved] + (["cc"] if info.save_cc else [])
+            print(f"  isr {info.name} @0x{info.vector:04X}: saves {', '.join(saves) or 'nothing'}; "
+                  f"{info.cycles} cycles entry+exit, full context {info.full_cycles}, "
+                  f"{info.full_cycles - info.cycles} saved"
+                  + (f" (indirect jump at line {info.unknown}: full save)" if info.unknown else ""))
 
 
 if __name__ == "__main__":
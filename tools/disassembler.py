@@ -0,0 +1,523 @@
+#!/usr/bin/env python3
+import sys
+import re
+import pickle
+import hashlib
+import argparse
+from pathlib import Path
+
+from assembler import (
+    OPCODES, FN, RI, MEM, BR_COND, ABI_REGS,
+    assemble_line, expand_includes, expand_macros, expand_isrs, first_pass,
+)
+
+# Bump when the rendering below changes so stale on-disk caches are rebuilt.
+TABLE_FORMAT = 1
+
+NOP_WORD = 0xF000
+
+# ops whose imm4 is extended by a preceding IMM prefix (RTL `imm16` users)
+IMM_USERS = (
+    OPCODES["JAL"], OPCODES["ADDI"], OPCODES["RI"],
+    OPCODES["LW"], OPCODES["LB"], OPCODES["SW"], OPCODES["SB"],
+)
+
+# trace field carrying the instruction word, e.g. "insn=0x1D0F"
+INSN_MARKER = "insn="
+
+
+# ------------- decode table -------------
+
+_FN_NAMES  = {v: k for k, v in FN.items()}
+_RI_NAMES  = {v: k for k, v in RI.items()}
+_MEM_NAMES = {v: k for k, v in MEM.items()}
+_BR_NAMES  = {v: k for k, v in BR_COND.items()}
+
+
+def reg_names(abi_names: bool = True) -> list[str]:
+    """
+    Register index -> printed name. With ABI names the first alias in
+    ABI_REGS wins (a0 over v0, a1 over v1).
+    """
+    names = [f"r{i}" for i in range(16)]
+    if abi_names:
+        seen = set()
+        for name, idx in ABI_REGS.items():
+            if idx not in seen:
+                names[idx] = name
+                seen.add(idx)
+    return names
+
+
+def _sext4(n: int) -> int:
+    return n - 16 if n & 0x8 else n
+
+
+def _sext8(n: int) -> int:
+    return n - 256 if n & 0x80 else n
+
+
+def decode_word(w: int, regs: list[str]):
+    """
+    Decode one instruction word on its own (no PC, no prefix context).
+
+    Returns (text, head): `text` is assembler-ready source for the word,
+    `head` is the text up to the immediate operand for IMM-prefix users
+    and branches (None otherwise). Words with no mnemonic encoding come
+    back as `.word 0xXXXX` so a listing still reassembles exactly.
+    """
+    op = (w >> 12) & 0xF
+    rd = (w >> 8) & 0xF
+    rs = (w >> 4) & 0xF
+    lo = w & 0xF
+
+    if op == OPCODES["JAL"]:
+        head = f"JAL   {regs[rd]}, {regs[rs]}, "
+        return head + f"#{lo}", head
+
+    if op == OPCODES["ADDI"]:
+        head = f"ADDI  {regs[rd]}, {regs[rs]}, "
+        return head + f"#{_sext4(lo)}", head
+
+    if op == OPCODES["RR"]:
+        mnem = _FN_NAMES.get(lo)
+        if mnem is not None:
+            return f"{mnem:<5} {regs[rd]}, {regs[rs]}", None
+
+    if op == OPCODES["RI"]:
+        mnem = _RI_NAMES.get(rs)
+        if mnem is not None:
+            head = f"{mnem:<5} {regs[rd]}, "
+            return head + f"#{_sext4(lo)}", head
+
+    if op in _MEM_NAMES:
+        head = f"{_MEM_NAMES[op]:<5} {regs[rd]}, {regs[rs]}, "
+        return head + f"#{lo}", head
+
+    if op == OPCODES["IMM"]:
+        return f"IMM   #0x{w & 0xFFF:03X}", None
+
+    if op == OPCODES["B"]:
+        mnem = _BR_NAMES.get(rd)
+        if mnem is not None:
+            head = f"{mnem:<5} "
+            return head + f"#{_sext8(w & 0xFF)}", head
+
+    if op == OPCODES["SYS"]:
+        # GETCC rd / SETCC rs, see assemble_line()
+        if lo == 0x9 and rs == 0:
+            return f"GETCC {regs[rd]}", None
+        if lo == 0xA and rd == 0:
+            return f"SETCC {regs[rs]}", None
+
+    if w == OPCODES["CLI"] << 12:
+        return "CLI", None
+    if w == OPCODES["STI"] << 12:
+        return "STI", None
+    if w == NOP_WORD:
+        return "NOP", None
+
+    return f".word 0x{w:04X}", None
+
+
+def build_table(abi_names: bool = True):
+    """
+    Decode all 65536 instruction words. Returns (text, head) lists
+    indexed by word, see decode_word().
+    """
+    regs = reg_names(abi_names)
+    text = [None] * 0x10000
+    head = [None] * 0x10000
+    for w in range(0x10000):
+        text[w], head[w] = decode_word(w, regs)
+    return text, head
+
+
+def _table_key(abi_names: bool) -> str:
+    """
+    Fingerprint of everything the table depends on, so a cache written
+    against an older opcode map is never reused.
+    """
+    src = repr((TABLE_FORMAT, abi_names, OPCODES, FN, RI, MEM, BR_COND, ABI_REGS))
+    return hashlib.sha1(src.encode()).hexdigest()
+
+
+_tables = {}  # abi_names -> (text, head)
+
+
+def get_table(abi_names: bool = True, cache_path=None):
+    """
+    Lazily build (or load) the decode table.
+
+    The table is kept in memory after the first call. With `cache_path`
+    it is also loaded from / saved to disk; a missing, unreadable or
+    stale cache file is silently rebuilt, and a cache location that cannot
+    be written only costs the rebuild on the next run.
+    """
+    if abi_names in _tables:
+        return _tables[abi_names]
+
+    key = _table_key(abi_names)
+    table = None
+
+    if cache_path is not None:
+        cache_path = Path(cache_path)
+        try:
+            with cache_path.open("rb") as f:
+                cached = pickle.load(f)
+            if cached.get("key") == key:
+                table = (cached["text"], cached["head"])
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+            table = None
+
+    if table is None:
+        table = build_table(abi_names)
+        if cache_path is not None:
+            tmp = cache_path.with_name(cache_path.name + ".tmp")
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                with tmp.open("wb") as f:
+                    pickle.dump({"key": key, "text": table[0], "head": table[1]}, f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                tmp.replace(cache_path)
+            except OSError:
+                pass
+
+    _tables[abi_names] = table
+    return table
+
+
+def disasm_word(w: int, abi_names: bool = True) -> str:
+    """Disassemble a single word with no PC or prefix context."""
+    return get_table(abi_names)[0][w & 0xFFFF]
+
+
+# ------------- context-aware rendering -------------
+
+def _render(w, pc, prefix, text, head, labels):
+    """
+    Render `w` at byte address `pc` given the preceding IMM prefix (12-bit
+    value or None). Returns (source_text, note) where note is an optional
+    comment such as a resolved branch target.
+    """
+    op = w >> 12
+    h = head[w]
+
+    if h is not None and op == OPCODES["B"]:
+        target = (pc + 2 + 2 * _sext8(w & 0xFF)) & 0xFFFF
+        if labels and target in labels:
+            return h + labels[target], None
+        return text[w], f"-> 0x{target:04X}"
+
+    if prefix is not None and h is not None and op in IMM_USERS:
+        imm16 = (prefix << 4) | (w & 0xF)
+        # absolute jump through r0 (J / CALL): imm16 is the target
+        if labels and op == OPCODES["JAL"] and (w >> 4) & 0xF == 0 and imm16 in labels:
+            return h + f"{labels[imm16]} & 0xF", None
+        return h + f"#0x{imm16:04X} & 0xF", None
+
+    return text[w], None
+
+
+def _prefix_text(i12, next_w, head, labels):
+    """IMM text once we know it extends `next_w`."""
+    if next_w is None or head[next_w] is None or (next_w >> 12) not in IMM_USERS:
+        return None
+    imm16 = (i12 << 4) | (next_w & 0xF)
+    if labels and next_w >> 12 == OPCODES["JAL"] and (next_w >> 4) & 0xF == 0 and imm16 in labels:
+        return f"IMM   {labels[imm16]} >> 4"
+    return f"IMM   #0x{imm16:04X} >> 4"
+
+
+def disassemble(words, labels=None, origin: int = 0, abi_names: bool = True,
+                cache_path=None) -> list[str]:
+    """
+    Produce an assembler-ready listing for a word image.
+
+    - labels: optional dict byte_addr -> name, emitted as `name:` lines and
+      used for branch / J / CALL targets
+    - origin: byte address of words[0]
+
+    IMM prefixes are folded into the instruction they extend, using the
+    same `expr >> 4` / `expr & 0xF` split as the LI/J/CALL macros. Runs of
+    padding NOPs are collapsed back into `.org`. Reassembling the listing
+    with tools/assembler.py reproduces `words` exactly for origin 0; the
+    assembler always starts at 0, so a non-zero origin comes back behind
+    origin/2 words of NOP padding (words == image[origin // 2:]). Labels
+    and absolute targets keep their addresses, so the padding is kept
+    rather than stripped.
+    """
+    text, head = get_table(abi_names, cache_path)
+    words = [w & 0xFFFF for w in words]
+    n = len(words)
+    # only labels inside the image can be defined by the listing
+    end = origin + 2 * n
+    labels = {a: name for a, name in (labels or {}).items() if origin <= a < end}
+
+    out = []
+    if origin:
+        out.append(f"; origin 0x{origin:04X}: reassembles behind {origin // 2} padding words")
+        out.append(f"    .org 0x{origin:04X}")
+
+    i = 0
+    prefix = None
+    while i < n:
+        pc = origin + 2 * i
+        w = words[i]
+
+        # collapse NOP padding up to the next real word into .org
+        if w == NOP_WORD and pc not in labels:
+            j = i
+            while j < n and words[j] == NOP_WORD and (origin + 2 * j) not in labels:
+                j += 1
+            if j - i > 2 and j < n:
+                out.append(f"    .org 0x{origin + 2 * j:04X}")
+                prefix = None
+                i = j
+                continue
+
+        if pc in labels:
+            out.append(f"{labels[pc]}:")
+
+        if w >> 12 == OPCODES["IMM"]:
+            nxt = words[i + 1] if i + 1 < n and (pc + 2) not in labels else None
+            src = _prefix_text(w & 0xFFF, nxt, head, labels)
+            note = None
+            # only fold the user if its IMM was folded too
+            prefix = w & 0xFFF if src is not None else None
+            src = src or text[w]
+        else:
+            src, note = _render(w, pc, prefix, text, head, labels)
+            prefix = None
+
+        comment = f"; {pc:04X}: {w:04X}"
+        if note:
+            comment += f"  {note}"
+        out.append(f"    {src:<32}{comment}")
+        i += 1
+
+    return out
+
+
+_hex_index = {}  # abi_names -> {hex4: (suffix, i12, head, low4)}
+
+
+def _get_hex_index(abi_names: bool, cache_path=None):
+    """
+    4-digit hex string (either case) -> (suffix, i12, head, low4) for the
+    trace annotator: `suffix` is the ready-made " ; TEXT" comment, `i12`
+    the prefix value if the word is an IMM, `head`/`low4` what is needed
+    to fold a preceding IMM into it. Keyed on the string so the hot loop
+    never converts to int.
+    """
+    if abi_names in _hex_index:
+        return _hex_index[abi_names]
+    text, head = get_table(abi_names, cache_path)
+    imm_op = OPCODES["IMM"]
+    index = {}
+    for w in range(0x10000):
+        op = w >> 12
+        ent = (
+            f"  ; {text[w]}",
+            w & 0xFFF if op == imm_op else None,
+            head[w] if op in IMM_USERS else None,
+            w & 0xF,
+        )
+        index[f"{w:04x}"] = ent
+        index[f"{w:04X}"] = ent
+    _hex_index[abi_names] = index
+    return index
+
+
+def annotate_lines(lines, marker: str = INSN_MARKER, field_re=None,
+                   abi_names: bool = True, cache_path=None):
+    """
+    Append the disassembly of each trace line's instruction word.
+
+    `lines` is any iterable of text lines. The instruction is the 4 hex
+    digits (optionally `0x`-prefixed) right after `marker`, or the first
+    group of `field_re` when given (slower). Lines without an instruction
+    pass through unchanged. An IMM followed by one of its users is folded
+    into the user's immediate, e.g. `ADDI  sp, zero, #0x03FF`.
+    Line endings are preserved.
+    """
+    index = _get_hex_index(abi_names, cache_path)
+    get = index.get
+    search = field_re.search if field_re is not None else None
+    mlen = len(marker)
+    prefix = None
+
+    for line in lines:
+        if search is None:
+            i = line.find(marker)
+            if i < 0:
+                yield line
+                continue
+            i += mlen
+            if line.startswith("0x", i):
+                i += 2
+            ent = get(line[i:i + 4])
+        else:
+            m = search(line)
+            ent = get(m.group(1).rjust(4, "0")) if m is not None else None
+        if ent is None:
+            yield line
+            continue
+
+        suffix, i12, head, low = ent
+        if prefix is not None and head is not None:
+            suffix = f"  ; {head}#0x{(prefix << 4) | low:04X}"
+        prefix = i12
+
+        if line.endswith("\n"):
+            yield line[:-1] + suffix + "\n"
+        else:
+            yield line + suffix
+
+
+# ------------- helpers -------------
+
+def read_hex_image(path: Path) -> list[int]:
+    """Read a combined 16-bit hex image (one word per line, `mem.hex` style)."""
+    words = []
+    for line_no, raw in enumerate(path.read_text().splitlines(), start=1):
+        tok = raw.split("//", 1)[0].strip()
+        if not tok or tok.startswith("@"):
+            continue
+        try:
+            words.append(int(tok, 16) & 0xFFFF)
+        except ValueError:
+            raise ValueError(f"{path}:{line_no}: bad hex word {raw!r}")
+    return words
+
+
+def load_labels(asm_path: Path) -> dict[int, str]:
+    """
+    Run the assembler front end over `asm_path` and return its labels as
+    byte_addr -> name (first label wins when several share an address).
+    """
+    raw_lines = asm_path.read_text().splitlines()
+    lines = expand_macros(expand_includes(raw_lines, asm_path.resolve()))
+    lines, _ = expand_isrs(lines)
+    symbols, sym_kind, _ = first_pass(lines)
+    labels = {}
+    for name, addr in symbols.items():
+        if sym_kind.get(name) == "label":
+            labels.setdefault(addr, name)
+    return labels
+
+
+def verify_table(abi_names: bool = True, cache_path=None) -> list[int]:
+    """
+    Reassemble every table entry with assemble_line() and return the words
+    that do not round-trip (empty list on success). `.word` entries are
+    checked by value.
+    """
+    text, head = get_table(abi_names, cache_path)
+    bad = []
+    for w in range(0x10000):
+        src = text[w]
+        if src.startswith(".word"):
+            got = int(src.split()[1], 16)
+        else:
+            try:
+                got = assemble_line(src, 0)
+            except ValueError:
+                got = None
+        if got != w:
+            bad.append(w)
+    return bad
+
+
+# ------------- main -------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Disassemble GR0040/GR0041 hex images or annotate simulation traces",
+    )
+    parser.add_argument(
+        "input",
+        nargs="?",
+        default="srcs/mem/mem.hex",
+        help="combined 16-bit hex image (default: srcs/mem/mem.hex)",
+    )
+    parser.add_argument(
+        "-o",
+        "--out",
+        dest="out",
+        help="write listing / annotated trace here instead of stdout",
+    )
+    parser.add_argument(
+        "--asm",
+        dest="asm",
+        help="assembly source to take labels from (resolves branch/J/CALL targets)",
+    )
+    parser.add_argument(
+        "--org",
+        dest="org",
+        default="0",
+        help="byte address of the first word in the image (default: 0)",
+    )
+    parser.add_argument(
+        "--annotate",
+        action="store_true",
+        help="treat input as a text trace ('-' for stdin) and append disassembly to each line",
+    )
+    parser.add_argument(
+        "--field",
+        dest="field",
+        help="regex whose first group is the hex instruction word in a trace line "
+             f"(default: 4 hex digits after '{INSN_MARKER}')",
+    )
+    parser.add_argument("--raw-regs", action="store_true", help="print r0..r15 instead of ABI names")
+    parser.add_argument("--cache", dest="cache", help="on-disk decode table cache file")
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="check that all 65536 decodings reassemble to the same word, then exit",
+    )
+
+    args = parser.parse_args()
+    abi_names = not args.raw_regs
+
+    if args.verify:
+        bad = verify_table(abi_names, args.cache)
+        if bad:
+            for w in bad[:16]:
+                print(f"mismatch: 0x{w:04X} -> {disasm_word(w, abi_names)}", file=sys.stderr)
+            print(f"error: {len(bad)} words do not round-trip", file=sys.stderr)
+            sys.exit(1)
+        print("all 65536 words round-trip")
+        return
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        if args.annotate:
+            field_re = re.compile(args.field) if args.field else None
+            src = sys.stdin if args.input == "-" else open(args.input)
+            try:
+                out.writelines(
+                    annotate_lines(src, field_re=field_re, abi_names=abi_names,
+                                   cache_path=args.cache)
+                )
+            finally:
+                if src is not sys.stdin:
+                    src.close()
+            return
+
+        in_path = Path(args.input)
+        if not in_path.exists():
+            print(f"error: input file not found: {in_path}", file=sys.stderr)
+            sys.exit(2)
+
+        labels = load_labels(Path(args.asm)) if args.asm else None
+        words = read_hex_image(in_path)
+        listing = disassemble(words, labels, int(args.org, 0), abi_names, args.cache)
+        out.write("\n".join(listing) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
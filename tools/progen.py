@@ -0,0 +1,826 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import random
+import multiprocessing
+import argparse
+from bisect import bisect
+from functools import lru_cache
+from itertools import accumulate, permutations
+from pathlib import Path
+
+from assembler import (
+    FN, RI, MEM, BR_COND, ABI_REGS,
+    expand_includes, expand_isrs, expand_macros, first_pass, second_pass,
+)
+
+TOOLS_DIR = Path(__file__).resolve().parent
+ABI_INC   = TOOLS_DIR / "abi.inc"
+
+# --- memory layout of a generated program (byte addresses) ---
+VECTORS = {             # same fixed vectors as assembly/input.asm
+    "TIMER":  0x0020,
+    "TIMER1": 0x0040,
+    "PARIO":  0x0060,
+    "UART":   0x0080,
+}
+DATA_BASE  = 0x00C0     # 32 data words between the last vector and reset
+DATA_WORDS = 32
+RESET_VEC  = 0x0100
+STACK_TOP  = 0x03FF     # word address, as in input.asm (first PUSH lands at 0x03FE)
+CODE_LIMIT = 0x03C0     # code must end below here to leave room for the stack
+
+# --- register discipline ---
+# Writable by generated code. s3 is the loop counter, sp/gp/lr are
+# only touched by the fixed scaffolding, so loops always terminate and
+# stores always land in the data window or on the stack.
+DEST     = ("a0", "a1", "a2", "t0", "t1", "t2", "t3", "s0", "s1", "s2", "fp")
+DEST_NT0 = tuple(r for r in DEST if r != "t0")     # for macros clobbering t0
+SRC      = DEST + ("zero", "sp", "gp", "lr", "s3")
+
+
+def _with_raw(pool):
+    """Operand pool with raw `rN` spellings mixed in (1 in 7); parse_reg accepts both."""
+    return tuple(pool) * 6 + tuple(f"r{ABI_REGS[r]}" for r in pool)
+
+
+DEST_OP     = _with_raw(DEST)
+DEST_NT0_OP = _with_raw(DEST_NT0)
+SRC_OP      = _with_raw(SRC)
+# distinct register pairs / triples for G_SWAP and G_ROT3
+NT0_PAIRS   = tuple(permutations(DEST_NT0, 2))
+NT0_TRIPLES = tuple(permutations(DEST_NT0, 3))
+
+# imm4 operands: in-range values and values that only survive as the low
+# nibble (encode_imm4 accepts -128..127)
+IMM4_NEAR = (-8, -7, -2, -1, 0, 1, 2, 3, 6, 7)
+IMM4_WRAP = (-128, -100, -17, -16, -9, 8, 15, 16, 31, 100, 127)
+
+
+def _imm4_texts():
+    """Every imm4 operand spelling, weighted: ~1 in 4 wraps, `#n` / `n` / `#0xN`."""
+    out = []
+    for v in IMM4_NEAR * 3 + IMM4_WRAP:
+        hex_form = f"#0x{v:X}" if v >= 0 else str(v)
+        out += [f"#{v}"] * 3 + [str(v), hex_form]
+    return tuple(out)
+
+
+IMM4_OP = _imm4_texts()
+IMM16_FIXED = ("#K_A", "#K_B", "#K_MASK",
+               "#0x0000", "#0x000F", "#0x0010", "#0x7FFF", "#0x8000", "#0xFFFF")
+
+FN_NAMES  = tuple(FN)
+RI_NAMES  = tuple(RI)
+MEM_NAMES = tuple(MEM)
+BR_NAMES  = tuple(BR_COND)
+
+# ADC/SBC forms latch their carry-out (SETCC restores it from bit 4), and
+# the next adder op (ADD, ADDI, load/store and JAL address sums) adds it
+# in. Each one is followed by an instruction that consumes or drops the
+# latch, so it never leaks into the next item: a PUSH's ADDI sp, a POP's
+# LW or the loop's SUBI s3 would be off by one.
+CARRY_OPS = frozenset(("ADC", "SBC", "ADCI", "RSCBI"))
+CHAIN_OPS = ("ADD", "SUB")
+NO_ADDER_OPS = ("AND", "XOR", "SRL", "SRA")
+
+# abi.inc macro sizes in words (after expansion)
+MACRO_WORDS = {
+    "PUSH": 2, "POP": 2, "MOV": 1, "SUBI": 1, "NEG": 1, "COM": 2, "OR": 4,
+    "SLL": 1, "LEA": 1, "J": 2, "CALL": 2, "RET": 1, "LBS": 5, "LI": 2,
+    "PUSH_CC": 3, "POP_CC": 3, "ISR_PRO": 6, "IRET": 6,
+    "ISR_PROLOGUE": 12, "ISR_EPILOGUE": 13,
+}
+
+# default instruction mix (relative weights of body item kinds)
+DEFAULT_MIX = {
+    "alu":    6,    # RR / RI / ADDI
+    "imm":    2,    # IMM-prefixed forms and LI
+    "mem":    3,    # LW/LB/SW/SB/LBS on the data window
+    "macro":  3,    # abi.inc pseudo-ops and nested program macros
+    "flags":  1,    # GETCC/SETCC, PUSH_CC/POP_CC, CLI/STI, NOP
+    "stack":  1,    # balanced PUSH/POP
+    "branch": 2,    # forward conditional branches
+    "jump":   1,    # J over dead code
+    "call":   1,    # CALL / raw JAL into a generated function
+    "loop":   1,    # counted loop on s3
+}
+
+# items allowed inside branch shadows, loop bodies and functions
+STRAIGHT = ("alu", "imm", "mem", "macro", "flags", "stack")
+
+# seeds per worker task (-j)
+BATCH = 256
+
+# generated functions sit after `halt`, within this many words
+FUNC_WORDS = 96
+MAX_FUNCS  = 32
+
+# far hops at reset (word offsets from `far_hop`): BR +127 to the guard,
+# which branches -128 back to `far_tgt`; the body runs in between
+FAR_TGT_OFF   = 6       # BR plus 5 never-executed words
+FAR_GUARD_OFF = 128     # 1 + 127
+FAR_SPAN      = FAR_GUARD_OFF - FAR_TGT_OFF
+GUARD_WORDS   = 6       # IMM, RCMPI, ANDI, XORI, XOR, BEQ
+
+
+def parse_mix(text: str) -> dict:
+    """`alu=4,mem=1` -> DEFAULT_MIX with those weights replaced."""
+    mix = dict(DEFAULT_MIX)
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, val = part.partition("=")
+        name = name.strip().lower()
+        if not sep or name not in mix:
+            raise ValueError(f"bad mix entry '{part}' (kinds: {', '.join(mix)})")
+        mix[name] = float(val)
+        if mix[name] < 0:
+            raise ValueError(f"negative weight for '{name}'")
+    return mix
+
+
+class _Gen:
+    """
+    Generator state for one program. Every item method returns
+    (lines, words): source lines and the number of words they assemble to.
+
+    Hot paths pick from pre-built operand tables with a single
+    rng.random() call; random.choice()/randrange() cost several times that.
+    """
+
+    def __init__(self, rng: random.Random, size: int, mix: dict, macro_depth: int,
+                 fit: bool = True):
+        rnd = rng.random
+        self.rng = rng
+        self.rnd = rnd
+        # uniform pick / randrange(n) on one rng.random() call, bound as
+        # closures to skip the attribute lookups in the hot paths
+        self.pick = lambda seq: seq[int(rnd() * len(seq))]
+        self.below = lambda n: int(rnd() * n)
+        self.size = size
+        self.fit = fit
+        self.macro_depth = macro_depth
+        self.n_label = 0
+        self.funcs = []
+
+        # cumulative weights for bisect(); an all-zero mix falls back to alu
+        kinds = [k for k, w in mix.items() if w > 0]
+        self.kinds = kinds or ["alu"]
+        self.kinds_cum = list(accumulate(mix[k] for k in kinds)) or [1]
+        straight = [k for k in STRAIGHT if mix.get(k, 0) > 0]
+        self.straight = straight or ["alu"]
+        self.straight_cum = list(accumulate(mix[k] for k in straight)) or [1]
+
+    # ------------- operands -------------
+
+    def label(self, stem: str) -> str:
+        self.n_label += 1
+        return f"{stem}{self.n_label}"
+
+    def chain(self, mnem):
+        """Instruction after an ADC/SBC form or SETCC that clears the carry latch: (lines, words)."""
+        pick = self.pick
+        if mnem in CARRY_OPS:
+            tail = pick(CHAIN_OPS)      # carry-chain consumer
+        elif mnem == "SETCC":
+            tail = pick(NO_ADDER_OPS)   # keeps the restored flags
+        else:
+            return [], 0
+        return [f"{tail} {pick(DEST_OP)}, {pick(SRC_OP)}"], 1
+
+    def imm16(self) -> str:
+        r = self.rnd()
+        if r < 0.5:
+            return IMM16_FIXED[int(r * 18)]
+        return f"#0x{self.below(0x10000):04X}"
+
+    # ------------- straight-line items -------------
+
+    def alu(self):
+        pick = self.pick
+        r = self.rnd()
+        if r < 0.45:
+            mnem = pick(FN_NAMES)
+            rd = pick(SRC_OP if mnem == "CMP" else DEST_OP)
+            tail, n = self.chain(mnem)
+            return [f"{mnem} {rd}, {pick(SRC_OP)}"] + tail, 1 + n
+        if r < 0.75:
+            mnem = pick(RI_NAMES)
+            rd = pick(SRC_OP if mnem == "RCMPI" else DEST_OP)
+            tail, n = self.chain(mnem)
+            return [f"{mnem} {rd}, {pick(IMM4_OP)}"] + tail, 1 + n
+        return [f"ADDI {pick(DEST_OP)}, {pick(SRC_OP)}, {pick(IMM4_OP)}"], 1
+
+    def imm(self):
+        """IMM prefix interlocks: every imm16 user, a wasted and a doubled prefix."""
+        pick = self.pick
+        r = self.rnd()
+        if r < 0.35:
+            return [f"LI {pick(DEST_OP)}, {self.imm16()}"], 2
+        prefix = f"IMM #0x{self.below(0x1000):03X}"
+        if r < 0.55:
+            mnem = pick(RI_NAMES)
+            rd = pick(SRC_OP if mnem == "RCMPI" else DEST_OP)
+            tail, n = self.chain(mnem)
+            return [prefix, f"{mnem} {rd}, {pick(IMM4_OP)}"] + tail, 2 + n
+        if r < 0.7:
+            return [prefix, f"ADDI {pick(DEST_OP)}, {pick(SRC_OP)}, {pick(IMM4_OP)}"], 2
+        if r < 0.85:
+            # prefix consumed by an instruction that ignores it
+            mnem = pick(("ADD", "XOR", "CMP", "SRL"))
+            rd = pick(SRC_OP if mnem == "CMP" else DEST_OP)
+            return [prefix, f"{mnem} {rd}, {pick(SRC_OP)}"], 2
+        # back-to-back prefixes: only the second one extends the ADDI
+        return [prefix, f"IMM #0x{self.below(0x1000):03X}",
+                f"ADDI {pick(DEST_OP)}, zero, {pick(IMM4_OP)}"], 3
+
+    def mem(self):
+        """Loads/stores relative to gp; offsets (even wrapped) stay inside the data window."""
+        pick = self.pick
+        mnem = pick(MEM_NAMES)
+        reg = pick(DEST_OP if mnem in ("LW", "LB") else SRC_OP)
+        r = self.rnd()
+        if r < 0.15:
+            return [f"LBS {pick(DEST_NT0_OP)}, gp, #{self.below(16)}"], MACRO_WORDS["LBS"]
+        if r < 0.3:
+            # IMM #0 prefix: imm16 = {0, imm4}, no word-offset rotation
+            return ["IMM #0x000", f"{mnem} {reg}, gp, #{self.below(16)}"], 2
+        return [f"{mnem} {reg}, gp, {pick(IMM4_OP)}"], 1
+
+    def macro(self):
+        pick = self.pick
+        r = self.rnd()
+        if r < 0.12:
+            return [f"MOV {pick(DEST_OP)}, {pick(SRC_OP)}"], 1
+        if r < 0.22:
+            return [f"SUBI {pick(DEST_OP)}, {pick(SRC_OP)}, {pick((0, 1, 7, 8, 15, 128))}"], 1
+        if r < 0.30:
+            return [f"NEG {pick(DEST_OP)}"], 1
+        if r < 0.38:
+            return [f"COM {pick(DEST_OP)}"], 2
+        if r < 0.48:
+            return [f"OR {pick(DEST_NT0_OP)}, {pick(DEST_NT0_OP)}"], 4
+        if r < 0.56:
+            return [f"SLL {pick(DEST_OP)}"], 1
+        if r < 0.64:
+            return [f"LEA {pick(DEST_OP)}, {pick(SRC_OP)}, {pick(IMM4_OP)}"], 1
+        return self.nested()
+
+    def nested(self):
+        """Invoke one of the program-defined macros (see macro_defs())."""
+        pick = self.pick
+        r = self.rnd()
+        if r < 0.3:
+            x, y = pick(NT0_PAIRS)
+            return [f"G_SWAP {x}, {y}"], 3
+        if r < 0.55:
+            x, y, z = pick(NT0_TRIPLES)
+            return [f"G_ROT3 {x}, {y}, {z}"], 6
+        if r < 0.75:
+            return [f"G_LI2 {pick(DEST_OP)}, {pick(DEST_OP)}, {self.imm16()}"], 4
+        depth = self.below(self.macro_depth + 1)
+        return [f"G_N{depth} {pick(DEST_OP)}"], depth + 1
+
+    def flags(self):
+        pick = self.pick
+        r = self.rnd()
+        if r < 0.25:
+            return [f"GETCC {pick(DEST_OP)}"], 1
+        if r < 0.45:
+            tail, n = self.chain("SETCC")
+            return [f"SETCC {pick(SRC_OP)}"] + tail, 1 + n
+        if r < 0.65:
+            item, words = self.alu()
+            return ["PUSH_CC"] + item + ["POP_CC"], 6 + words
+        if r < 0.85:
+            return ["CLI", "STI"], 2
+        return ["NOP"], 1
+
+    def stack(self):
+        pick = self.pick
+        lines = [f"PUSH {pick(SRC_OP)}"]
+        words = 2
+        for _ in range(self.below(3)):
+            item, n = self.alu()
+            lines += item
+            words += n
+        lines.append(f"POP {pick(DEST_OP)}")
+        return lines, words + 2
+
+    def straight_item(self):
+        cum = self.straight_cum
+        kind = self.straight[bisect(cum, self.rnd() * cum[-1])]
+        if kind == "stack":
+            # keep PUSH/POP from nesting through straight_item()
+            return self.stack()
+        return getattr(self, kind)()
+
+    def straight_run(self, max_items: int):
+        lines, words = [], 0
+        for _ in range(self.below(max_items + 1)):
+            item, n = self.straight_item()
+            lines += item
+            words += n
+        return lines, words
+
+    # ------------- control flow (forward only, or counted) -------------
+
+    def branch(self, mnem=None):
+        """Conditional branch over a short run; both paths fall through forward."""
+        mnem = mnem or self.pick(BR_NAMES)
+        if self.rnd() < 0.1:
+            return [f"{mnem} #0"], 1          # branch to the next word
+        target = self.label("skip")
+        body, words = self.straight_run(3)
+        return [f"{mnem} {target}"] + body + [f"{target}:"], words + 1
+
+    def jump(self):
+        """J over code that is never executed."""
+        target = self.label("over")
+        body, words = self.straight_run(3)
+        return [f"J {target}"] + body + [f"{target}:"], words + 2
+
+    def call(self):
+        name = self.pick(self.funcs)
+        if self.rnd() < 0.5:
+            return [f"CALL {name}"], 2
+        # the CALL expansion written out by hand
+        return [f"IMM {name} >> 4", f"JAL lr, zero, {name} & 0xF"], 2
+
+    def loop(self):
+        """Counted loop on s3: SUBI sets Z on the last pass, BEQ leaves."""
+        rnd = self.rnd
+        top = self.label("loop")
+        end = self.label("done")
+        lines = [f"ADDI s3, zero, #{1 + self.below(7)}", f"{top}:"]
+        words = 1
+        body_words = 0
+        for _ in range(1 + self.below(4)):
+            if body_words > 64:
+                break               # keep `BR top` well inside -128 words
+            if rnd() < 0.25:
+                item, n = self.branch()
+            elif rnd() < 0.15 and self.funcs:
+                item, n = self.call()
+            else:
+                item, n = self.straight_item()
+            lines += item
+            body_words += n
+        lines += ["SUBI s3, s3, 1", f"BEQ {end}", f"BR {top}", f"{end}:"]
+        return lines, words + body_words + 3
+
+    def item(self):
+        cum = self.kinds_cum
+        kind = self.kinds[bisect(cum, self.rnd() * cum[-1])]
+        if kind == "call" and not self.funcs:
+            kind = "alu"
+        return getattr(self, kind)()
+
+    # ------------- program pieces -------------
+
+    def function(self, name: str, callee=None):
+        """Leaf function, or a non-leaf one saving lr around a call."""
+        lines = [f"{name}:"]
+        words = 0
+        if callee is not None:
+            lines += ["PUSH lr", f"CALL {callee}"]
+            words += 4
+        body, n = self.straight_run(4)
+        lines += body
+        words += n
+        if self.rnd() < 0.3:
+            br, n = self.branch()
+            lines += br
+            words += n
+        if callee is not None:
+            lines.append("POP lr")
+            words += 2
+        lines.append("RET" if self.rnd() < 0.5 else "JAL zero, lr, #0")
+        return lines, words + 1
+
+    def coverage(self):
+        """One item per mnemonic / abi.inc macro not guaranteed by the scaffolding."""
+        pick = self.pick
+        items = []
+        for mnem in FN_NAMES:
+            rd = pick(SRC_OP if mnem == "CMP" else DEST_OP)
+            tail, n = self.chain(mnem)
+            items.append(([f"{mnem} {rd}, {pick(SRC_OP)}"] + tail, 1 + n))
+        for mnem in RI_NAMES:
+            rd = pick(SRC_OP if mnem == "RCMPI" else DEST_OP)
+            tail, n = self.chain(mnem)
+            items.append(([f"{mnem} {rd}, {pick(IMM4_OP)}"] + tail, 1 + n))
+        for mnem in MEM_NAMES:
+            reg = pick(DEST_OP if mnem in ("LW", "LB") else SRC_OP)
+            items.append(([f"{mnem} {reg}, gp, {pick(IMM4_OP)}"], 1))
+        for mnem in BR_NAMES:
+            items.append(self.branch(mnem))
+        items += [
+            ([f"ADDI {pick(DEST_OP)}, {pick(SRC_OP)}, {pick(IMM4_OP)}"], 1),
+            ([f"IMM #0x{self.below(0x1000):03X}", f"XORI {pick(DEST_OP)}, {pick(IMM4_OP)}"], 2),
+            ([f"GETCC {pick(DEST_OP)}"], 1),
+            ([f"SETCC {pick(SRC_OP)}"] + self.chain("SETCC")[0], 2),
+            (["CLI", "STI"], 2),
+            (["NOP"], 1),
+            ([f"MOV {pick(DEST_OP)}, {pick(SRC_OP)}"], 1),
+            ([f"SUBI {pick(DEST_OP)}, {pick(SRC_OP)}, 3"], 1),
+            ([f"NEG {pick(DEST_OP)}"], 1),
+            ([f"COM {pick(DEST_OP)}"], 2),
+            ([f"OR {pick(DEST_NT0_OP)}, {pick(DEST_NT0_OP)}"], 4),
+            ([f"SLL {pick(DEST_OP)}"], 1),
+            ([f"LEA {pick(DEST_OP)}, {pick(SRC_OP)}, {pick(IMM4_OP)}"], 1),
+            ([f"LBS {pick(DEST_NT0_OP)}, gp, #{self.below(16)}"], 5),
+            (["PUSH_CC", "POP_CC"], 6),
+            (["G_ROT3 a0, a1, a2"], 6),
+            ([f"G_N{self.macro_depth} {pick(DEST_OP)}"], self.macro_depth + 1),
+            self.jump(),
+            self.call(),
+            self.loop(),
+        ]
+        return items
+
+    def vectors(self):
+        """Interrupt return stub, software-interrupt slot, ISRs and data window."""
+        lines = [
+            "    .org K_INTR_RET",
+            "intr_ret:",
+            "    JAL   r14, r14, #0",
+            "isr_swint:",
+            "    BR    intr_ret",
+        ]
+        for name in ("TIMER", "TIMER1", "PARIO"):
+            alu, _ = self.alu()
+            lines += [
+                f"    .org K_{name}_VEC",
+                f"isr_{name.lower()}:",
+                "    ISR_PRO",
+                *(f"    {ln}" for ln in alu),
+                "    IRET",
+            ]
+        lines += [
+            "    .org K_UART_VEC",
+            "isr_uart:",
+            "    ISR_PROLOGUE",
+            "    ISR_EPILOGUE",
+            "",
+            "    .org K_DATA",
+            "g_data:",
+        ]
+        rnd = self.rnd
+        hex_words = f"{self.rng.getrandbits(16 * DATA_WORDS):0{4 * DATA_WORDS}X}"
+        for i in range(0, 4 * DATA_WORDS, 4):
+            r = rnd()
+            if r < 0.1:
+                lines.append("    .word g_data")
+            elif r < 0.2:
+                lines.append(f"    .word {('K_A', 'K_B', 'K_MASK')[int(r * 30) - 3]}")
+            else:
+                lines.append(f"    .word 0x{hex_words[i:i + 4]}")
+        return lines
+
+    def functions(self):
+        """All generated functions, within FUNC_WORDS; ones past it shrink to a bare RET."""
+        out = []
+        budget = FUNC_WORDS
+        n_funcs = len(self.funcs)
+        for i, name in enumerate(self.funcs):
+            callee = self.funcs[i - 1] if i and self.rnd() < 0.5 else None
+            lines, words = self.function(name, callee)
+            # leave one word for each function still to come
+            if words > budget - (n_funcs - i - 1):
+                lines, words = [f"{name}:", "RET"], 1
+            budget -= words
+            out += lines
+        return out, FUNC_WORDS - budget
+
+    def program(self, seed: int, abi_include: str) -> str:
+        self.funcs = [f"fn{i}" for i in range(min(1 + self.size // 16, MAX_FUNCS))]
+        funcs, func_words = self.functions()
+
+        # main body: coverage items plus up to `size` random ones, in random
+        # order. With `fit`, generation stops once the body fills both parts
+        # and the few random items the packing cannot place are dropped, so
+        # the image ends below CODE_LIMIT.
+        budget = (CODE_LIMIT // 2 - RESET_VEC // 2 - 4 - FAR_GUARD_OFF - GUARD_WORDS
+                  - 1 - func_words)
+        cover = self.coverage()
+        items = list(cover)
+        body_words = sum(n for _, n in cover)
+        item = self.item
+        for _ in range(self.size):
+            if self.fit and body_words >= FAR_SPAN + budget:
+                break
+            items.append(item())
+            body_words += items[-1][1]
+        keys = [self.rnd() for _ in items]     # cheaper than rng.shuffle()
+        order = sorted(range(len(items)), key=keys.__getitem__)
+
+        # first part (up to the guard) packed first-fit, coverage items first,
+        # so the padding stays small and only droppable items are left over
+        span = 0
+        in_first = [False] * len(items)
+        for want_cover in (True, False):
+            for i in order:
+                if (i < len(cover)) == want_cover and span + items[i][1] <= FAR_SPAN:
+                    in_first[i] = True
+                    span += items[i][1]
+        first = [i for i in order if in_first[i]]
+        rest = [i for i in order if not in_first[i]]
+        if self.fit:
+            rest_words = sum(items[i][1] for i in rest)
+            keep = []
+            for i in reversed(rest):
+                if rest_words > budget and i >= len(cover):
+                    rest_words -= items[i][1]
+                else:
+                    keep.append(i)
+            rest = keep[::-1]
+
+        out = [
+            f"; generated by tools/progen.py seed={seed} size={self.size}",
+            _header(abi_include, self.macro_depth),
+            f"    .equ K_A, {self.below(0x10000)}",
+            f"    .equ K_B, 0x{self.below(0x10000):04X}",
+            "",
+        ]
+        out += self.vectors()
+        out += [
+            "",
+            "    .org K_RESET",
+            "reset:",
+            "    LI    sp, #K_STACK",
+            "    LI    gp, #K_DATA_W",
+        ]
+
+        # Branch-range boundaries and an .org gap, spanning the body: BR +127
+        # to the guard, which branches -128 back to far_tgt on the first
+        # visit only (sp == K_STACK; XOR flips sp's low bit without touching
+        # the flags). The body up to the guard then falls into it, the
+        # branch is not taken, and the rest of the body follows. Padding
+        # NOPs only appear when that first part is shorter than FAR_SPAN.
+        out += [
+            "far_hop:",
+            "    BR    far_guard",              # +127
+            "    .word far_tgt",                # never executed
+            "    .word far_guard",
+            "    .word K_STACK",
+            "    .word halt",
+            "    .word g_data",
+            "far_tgt:",
+        ]
+        for i in first:
+            out += [ln if ln[-1] == ":" else "    " + ln for ln in items[i][0]]
+        out += [
+            f"    .org far_hop+{2 * FAR_GUARD_OFF}",
+            "far_guard:",
+            "    IMM   K_STACK >> 4",
+            "    RCMPI sp, K_STACK & 0xF",
+            "    ANDI  t0, #0",                 # t0 = 1 without the adder or flags
+            "    XORI  t0, #1",
+            "    XOR   sp, t0",
+            "    BEQ   far_tgt",                # -128
+        ]
+        for i in rest:
+            out += [ln if ln[-1] == ":" else "    " + ln for ln in items[i][0]]
+        out += [
+            "halt:",
+            "    BR    halt",
+        ]
+        out += [ln if ln[-1] == ":" else "    " + ln for ln in funcs]
+        out.append("")
+        return "\n".join(out)
+
+
+@lru_cache(maxsize=None)
+def _header(abi_include: str, macro_depth: int) -> str:
+    """Seed-independent part of the program header: include, constants, macros."""
+    lines = [
+        f'.include "{abi_include}"',
+        "",
+        "    .equ K_INTR_RET, 0x0000",
+    ]
+    lines += [f"    .equ K_{name}_VEC, 0x{addr:04X}" for name, addr in VECTORS.items()]
+    lines += [
+        f"    .equ K_DATA, 0x{DATA_BASE:04X}",
+        f"    .equ K_DATA_W, 0x{DATA_BASE // 2:04X}",
+        f"    .equ K_RESET, 0x{RESET_VEC:04X}",
+        f"    .equ K_STACK, 0x{STACK_TOP:04X}",
+        "    .equ K_MASK, 0x00FF",
+        "",
+        # program-level macros, built on abi.inc and on each other
+        "; swap two registers through t0",
+        ".macro G_SWAP rx, ry",
+        "    MOV  t0, \\rx",
+        "    MOV  \\rx, \\ry",
+        "    MOV  \\ry, t0",
+        ".endm",
+        "",
+        "; rotate three registers (nested G_SWAP)",
+        ".macro G_ROT3 rx, ry, rz",
+        "    G_SWAP \\rx, \\ry",
+        "    G_SWAP \\ry, \\rz",
+        ".endm",
+        "",
+        "; load the same constant twice (nested LI)",
+        ".macro G_LI2 rx, ry, k",
+        "    LI \\rx, \\k",
+        "    LI \\ry, \\k",
+        ".endm",
+        "",
+        "; chain of nested macros, G_Nk expands to k+1 words",
+        ".macro G_N0 rx",
+        "    ADDI \\rx, \\rx, #1",
+        ".endm",
+    ]
+    for k in range(1, macro_depth + 1):
+        lines += [
+            f".macro G_N{k} rx",
+            f"    G_N{k - 1} \\rx",
+            "    SLL \\rx",
+            ".endm",
+        ]
+    return "\n".join(lines)
+
+
+def generate(seed: int, size: int = 16, mix=None, macro_depth: int = 3,
+             abi_include: str = str(ABI_INC), fit: bool = True) -> str:
+    """
+    Generate one program as assembly source.
+
+    - seed: the program is a pure function of (seed, size, mix, macro_depth, fit)
+    - size: random body items on top of the per-mnemonic coverage items
+    - mix: item-kind weights, see DEFAULT_MIX / parse_mix()
+    - abi_include: path written into the `.include` line
+    - fit: keep only as many random items as fit below CODE_LIMIT; without
+      it all `size` items are emitted and large images outgrow the BRAM
+      (assembler input only, they cannot be loaded)
+
+    Control flow is forward-only apart from counted loops on s3, and
+    functions never recurse, so execution always reaches `halt`.
+    """
+    if not 0 <= macro_depth <= 15:
+        raise ValueError("macro depth must be 0..15")
+    rng = random.Random(seed)
+    return _Gen(rng, size, mix or DEFAULT_MIX, macro_depth, fit).program(seed, abi_include)
+
+
+def assemble_source(text: str, path: Path) -> list[int]:
+    """Run the assembler pipeline on in-memory source (`path` anchors .include)."""
+    lines = expand_macros(expand_includes(text.splitlines(), path))
+    lines, _ = expand_isrs(lines)
+    symbols, sym_kind, cooked = first_pass(lines)
+    return second_pass(cooked, symbols, sym_kind)
+
+
+def _run_one(seed: int, opts: dict):
+    """
+    Generate (and optionally write / assemble) one program.
+    Returns (seed, text or None, image words or None, error or None);
+    text is only passed back when it goes to stdout.
+    """
+    text = generate(seed, opts["size"], opts["mix"], opts["macro_depth"], opts["abi_include"],
+                    opts["fit"])
+    out_dir = opts["out_dir"]
+    if out_dir is not None:
+        path = out_dir / f"prog_{seed:06d}.asm"
+        path.write_text(text)
+    else:
+        path = Path.cwd() / "progen.asm"
+    words = err = None
+    if opts["check"]:
+        try:
+            words = len(assemble_source(text, path.resolve()))
+        except (ValueError, FileNotFoundError) as exc:
+            err = str(exc)
+    return seed, (text if out_dir is None else None), words, err
+
+
+def _run_batch(job):
+    seeds, opts = job
+    return [_run_one(seed, opts) for seed in seeds]
+
+
+# ------------- main -------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate random, terminating GR0040 assembly programs",
+    )
+    parser.add_argument("-n", "--count", type=int, default=1, help="number of programs (default: 1)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the first program (default: 0)")
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=16,
+        help="random body items per program on top of coverage items; without --no-fit "
+             "only as many as fit below CODE_LIMIT are kept (default: 16)",
+    )
+    parser.add_argument(
+        "--no-fit",
+        dest="fit",
+        action="store_false",
+        help="emit all --size items even past CODE_LIMIT (assembler stress input, not loadable)",
+    )
+    parser.add_argument(
+        "--mix",
+        default="",
+        help="item weights, e.g. 'alu=4,mem=2,loop=0' "
+             f"(kinds: {', '.join(DEFAULT_MIX)})",
+    )
+    parser.add_argument("--macro-depth", type=int, default=3, help="nested macro chain depth (default: 3)")
+    parser.add_argument(
+        "-o",
+        "--out-dir",
+        dest="out_dir",
+        help="write prog_<seed>.asm files here (default: concatenate to stdout)",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="assemble every program and report failures and BRAM fit",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="worker processes; throughput scales with cores (default: 1)",
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="suppress summary output")
+
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        sys.exit(2)
+
+    out_dir = Path(args.out_dir) if args.out_dir else None
+    if out_dir is not None:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        # relative include inside the repo, absolute for a corpus elsewhere
+        if out_dir.resolve().is_relative_to(TOOLS_DIR.parent):
+            abi_include = os.path.relpath(ABI_INC, out_dir.resolve())
+        else:
+            abi_include = str(ABI_INC)
+    else:
+        abi_include = str(ABI_INC)
+
+    opts = {
+        "size": args.size,
+        "mix": mix,
+        "macro_depth": args.macro_depth,
+        "abi_include": abi_include,
+        "out_dir": out_dir,
+        "check": args.check,
+        "fit": args.fit,
+    }
+    seeds = range(args.seed, args.seed + args.count)
+    batches = [(seeds[i:i + BATCH], opts) for i in range(0, len(seeds), BATCH)]
+
+    failed = 0
+    too_big = 0
+    max_words = 0
+    t0 = time.perf_counter()
+    pool = multiprocessing.Pool(args.jobs) if args.jobs > 1 else None
+    try:
+        # imap keeps the output in seed order
+        results = pool.imap(_run_batch, batches) if pool else map(_run_batch, batches)
+        for batch in results:
+            for seed, text, words, err in batch:
+                if text is not None:
+                    sys.stdout.write(text + "\n")
+                if err is not None:
+                    failed += 1
+                    print(f"error: seed {seed}: {err}", file=sys.stderr)
+                elif words is not None:
+                    max_words = max(max_words, words)
+                    if args.fit and words * 2 > CODE_LIMIT:
+                        too_big += 1
+                        print(f"error: seed {seed}: image is {words} words, past "
+                              f"0x{CODE_LIMIT:04X}", file=sys.stderr)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - t0
+
+    if not args.quiet:
+        rate = args.count / elapsed if elapsed else float("inf")
+        summary = f"generated {args.count} programs in {elapsed:.2f}s ({rate:.0f}/s)"
+        if args.check:
+            summary += f", {failed} failed to assemble, largest image {max_words} words"
+            if args.fit:
+                summary += f", {too_big} past 0x{CODE_LIMIT:04X} (BRAM minus stack)"
+        print(summary, file=sys.stderr)
+
+    if failed or too_big:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+import re
+import sys
+import argparse
+from collections import deque
+from pathlib import Path
+
+from disassembler import disasm_word
+
+# iret_detected in the RTL: JAL r14, r14, #0 (the INTR_RET stub)
+IRET_INSN = "0ee0"
+NOP_INSN  = "f000"
+
+# record kinds
+INSN = "I"
+IRQ  = "Q"
+
+# fields compared between records, in report order
+FIELDS = ("pc", "insn", "rf", "mw", "mb")
+
+# data fields; not compared inside excursions taken at different points
+DATA_FIELDS = ("rf", "mw", "mb")
+
+# `irq=` as a field of its own, not the tail of e.g. tb_Soc's `in_irq=`
+irq_re = re.compile(r"(?:^|\s)irq=(\S+)")
+
+
+# ------------- trace reading -------------
+
+def read_records(lines, keep_nops: bool = False):
+    """
+    Turn trace text lines into records, streaming.
+
+    A line holding `pc=` is an instruction record (the payload is the text
+    from `pc=` on, up to any `;` comment), a line holding an `irq=` field is
+    an interrupt entry. Everything else (stall lines, headers, $monitor
+    output) is skipped, which is what aligns traces across `rdy` wait
+    states. NOPs carry no architectural effect and are dropped too unless
+    keep_nops is set.
+
+    Yields (line_no, kind, payload, insn) tuples; `insn` is the lower-case
+    4-digit instruction word for INSN records and the vector for IRQ.
+    """
+    for line_no, line in enumerate(lines, start=1):
+        i = line.find("pc=")
+        if i >= 0:
+            j = line.find(";", i)
+            payload = line[i:j].rstrip() if j >= 0 else line[i:].rstrip()
+            # tb_Soc layout "pc=XXXX insn=XXXX" first, then a general search
+            if payload.startswith("insn=", 8):
+                k = 13
+            else:
+                k = payload.find("insn=")
+                if k < 0:
+                    continue
+                k += 5
+                if payload.startswith("0x", k):
+                    k += 2
+            insn = payload[k:k + 4].lower()
+            if insn == NOP_INSN and not keep_nops:
+                continue
+            yield line_no, INSN, payload, insn
+            continue
+
+        m = irq_re.search(line) if "irq=" in line else None
+        if m:
+            vec = m.group(1).lower()
+            if vec.startswith("0x"):
+                vec = vec[2:]
+            yield line_no, IRQ, f"irq={vec}", vec
+
+
+def parse_fields(payload: str) -> dict:
+    """
+    `pc=0102 insn=1d0f rf=d:03ff` -> {"pc": (0x102,), "insn": (0x1d0f,),
+    "rf": (0xd, 0x3ff)}. Values are hex, optionally `0x`-prefixed.
+    """
+    fields = {}
+    for tok in payload.split():
+        key, sep, val = tok.partition("=")
+        if not sep:
+            continue
+        try:
+            fields[key.lower()] = tuple(int(v, 16) for v in val.split(":"))
+        except ValueError:
+            fields[key.lower()] = (val.lower(),)
+    return fields
+
+
+def record_diff(a, b, ignore=()):
+    """
+    Compare two records. Returns None when they agree, otherwise the name
+    of the first differing field. A field logged on one side only (e.g. a
+    register write the other side did not make) is a difference; fields
+    in `ignore` are skipped, for reference traces that never log them.
+    """
+    if a[1] != b[1]:
+        return "kind"
+    if a[2] == b[2]:
+        return None
+    if a[1] == IRQ:
+        return "vector"
+    fa = parse_fields(a[2])
+    fb = parse_fields(b[2])
+    for key in FIELDS:
+        if key not in ignore and fa.get(key) != fb.get(key):
+            return key
+    return None
+
+
+# ------------- comparison -------------
+
+class _Side:
+    """One trace: record iterator plus a bounded history for reporting."""
+
+    def __init__(self, name, records, context):
+        self.name = name
+        self.records = records
+        self.history = deque(maxlen=context)
+        self.peeked = None
+        self.pending = deque()   # (excursion, matched at entry, complete) not yet on the other side
+
+    def peek(self):
+        if self.peeked is None:
+            self.peeked = next(self.records, None)
+        return self.peeked
+
+    def take(self):
+        rec = self.peek()
+        self.peeked = None
+        if rec is not None:
+            self.history.append(rec)
+        return rec
+
+    def excursion(self, limit):
+        """
+        Consume an interrupt excursion: the IRQ record and everything up to
+        its matching iret (nested interrupts included). Returns (records,
+        complete); complete is False when the trace ends inside the handler
+        (bounded runs stop wherever they are). Returns None if the excursion
+        is longer than `limit` records.
+        """
+        out = [self.take()]
+        depth = 1
+        while depth:
+            if len(out) >= limit:
+                return None
+            rec = self.take()
+            if rec is None:
+                return out, False
+            out.append(rec)
+            if rec[1] == IRQ:
+                depth += 1
+            elif rec[3] == IRET_INSN:
+                depth -= 1
+        return out, True
+
+
+class Divergence:
+    """
+    First real difference between two traces. `around` optionally maps a
+    side to (before, after) record lists when the divergent record sits in
+    a buffered excursion rather than at the head of the stream.
+    """
+
+    def __init__(self, reason, rec_a, rec_b, around=None):
+        self.reason = reason
+        self.rec_a = rec_a
+        self.rec_b = rec_b
+        self.around = around or {}
+
+
+def _compare_excursions(xa, xb, ignore, displaced=False, partial=False):
+    """
+    Record-by-record check of two excursions. Returns (matched, Divergence or None).
+
+    A displaced pair (taken at different instruction boundaries) only has
+    its control flow compared: the saved context (return address, flags,
+    registers of the interrupted code) legitimately differs. A partial pair
+    (a trace ended inside the handler) is compared over the common prefix.
+    """
+    if displaced:
+        ignore = set(ignore).union(DATA_FIELDS)
+    for n, (x, y) in enumerate(zip(xa, xb)):
+        what = record_diff(x, y, ignore)
+        if what:
+            around = {"a": (xa[:n], xa[n + 1:]), "b": (xb[:n], xb[n + 1:])}
+            return n, Divergence(f"{what} differs inside interrupt", x, y, around)
+    if len(xa) != len(xb) and not partial:
+        n = min(len(xa), len(xb))
+        x = xa[n] if n < len(xa) else None
+        y = xb[n] if n < len(xb) else None
+        around = {"a": (xa[:n], xa[n + 1:]), "b": (xb[:n], xb[n + 1:])}
+        return n, Divergence("interrupt handler length differs", x, y, around)
+    return min(len(xa), len(xb)), None
+
+
+def compare(a: _Side, b: _Side, lookahead: int = 4096, ignore=()):
+    """
+    Walk both traces in lockstep. Returns (matched, Divergence or None).
+
+    Main-line instruction records must agree one-to-one. Interrupt
+    excursions (IRQ record .. matching iret) may be taken at different
+    instruction boundaries on the two sides: an excursion seen first on
+    one side is buffered until the other side takes its own, then the two
+    are compared record by record (control flow only when the entry points
+    differ). A trace ending inside a handler is not a divergence by itself:
+    the partial excursion is compared against the other side's. Buffered
+    records plus the main-line drift since the oldest buffered IRQ are
+    bounded by `lookahead`, so memory use does not grow with trace length.
+    """
+    matched = 0
+    buffered = 0   # records held in pending excursions
+    drift = 0      # main-line records matched while an excursion is pending
+
+    while True:
+        ra = a.peek()
+        rb = b.peek()
+
+        # interrupt entry on either side
+        if (ra is not None and ra[1] == IRQ) or (rb is not None and rb[1] == IRQ):
+            side, other = (a, b) if ra is not None and ra[1] == IRQ else (b, a)
+            rec = side.peek()
+            got = side.excursion(lookahead)
+            if got is None:
+                return matched, Divergence(
+                    f"interrupt on {side.name} (line {rec[0]}) does not return "
+                    f"within {lookahead} records",
+                    rec if side is a else other.peek(),
+                    rec if side is b else other.peek())
+            ex, complete = got
+
+            if other.pending:
+                ex_other, at, complete_other = other.pending.popleft()
+                buffered -= len(ex_other)
+                drift = 0
+                xa, xb = (ex, ex_other) if side is a else (ex_other, ex)
+                n, div = _compare_excursions(
+                    xa, xb, ignore, displaced=at != matched,
+                    partial=not (complete and complete_other))
+                matched += n
+                if div:
+                    return matched, div
+            else:
+                side.pending.append((ex, matched, complete))
+                buffered += len(ex)
+            continue
+
+        if ra is None or rb is None:
+            for side, other in ((a, b), (b, a)):
+                if side.pending:
+                    rec = side.pending[0][0][0]
+                    return matched, Divergence(
+                        f"interrupt on {side.name} (line {rec[0]}) never taken on {other.name}",
+                        rec if side is a else rb, rec if side is b else ra)
+            if ra is None and rb is None:
+                return matched, None
+            return matched, Divergence(
+                f"{a.name if ra is None else b.name} ended first", ra, rb)
+
+        if ra[2] == rb[2] and not a.pending and not b.pending:
+            # fast path: run of textually identical main-line records
+            it_a, it_b = a.records, b.records
+            hist_a, hist_b = a.history.append, b.history.append
+            while True:
+                hist_a(ra)
+                hist_b(rb)
+                matched += 1
+                ra = a.peeked = next(it_a, None)
+                rb = b.peeked = next(it_b, None)
+                if ra is None or rb is None or ra[2] != rb[2] or ra[1] != INSN:
+                    break
+            continue
+
+        what = record_diff(ra, rb, ignore)
+        if what:
+            return matched, Divergence(f"{what} differs", ra, rb)
+
+        a.take()
+        b.take()
+        matched += 1
+
+        if a.pending or b.pending:
+            drift += 1
+            if drift + buffered > lookahead:
+                side, other = (a, b) if a.pending else (b, a)
+                rec = side.pending[0][0][0]
+                return matched, Divergence(
+                    f"interrupt on {side.name} (line {rec[0]}) not taken on "
+                    f"{other.name} within {lookahead} records",
+                    rec if side is a else other.peek(),
+                    rec if side is b else other.peek())
+
+
+# ------------- reporting -------------
+
+def format_record(rec) -> str:
+    if rec is None:
+        return "<end of trace>"
+    line_no, kind, payload, insn = rec
+    if kind == IRQ:
+        return f"{line_no:>9}: {payload}"
+    try:
+        mnem = disasm_word(int(insn, 16))
+    except ValueError:
+        mnem = "?"
+    return f"{line_no:>9}: {payload:<44} ; {mnem}"
+
+
+def report(div: Divergence, matched: int, a: _Side, b: _Side, context: int,
+           out=sys.stdout):
+    """Print the divergence with `context` records before and after on each side."""
+    print(f"traces diverge after {matched} matching records: {div.reason}", file=out)
+    for key, side, rec in (("a", a, div.rec_a), ("b", b, div.rec_b)):
+        if key in div.around:
+            before, after = div.around[key]
+            after = list(after)
+        else:
+            hist = list(side.history)
+            if rec is None:
+                before, after = hist, []
+            else:
+                # excursions are consumed eagerly, so history may run past rec
+                before = [r for r in hist if r[0] < rec[0]]
+                after = [r for r in hist if r[0] > rec[0]]
+                if side.peeked is rec:
+                    side.peeked = None
+
+        print(f"\n--- {side.name}", file=out)
+        for r in before[-context:]:
+            print(f"    {format_record(r)}", file=out)
+        print(f" >> {format_record(rec)}", file=out)
+        after = after[:context]
+        while len(after) < context:
+            r = side.take()
+            if r is None:
+                break
+            after.append(r)
+        for r in after:
+            print(f"    {format_record(r)}", file=out)
+
+
+# ------------- main -------------
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare two GR0040 execution traces and report the first divergence",
+    )
+    parser.add_argument("trace_a", help="first trace (e.g. tb_Soc output with TB_TRACE), '-' for stdin")
+    parser.add_argument("trace_b", help="second trace (RTL or reference)")
+    parser.add_argument(
+        "-C",
+        "--context",
+        type=int,
+        default=8,
+        help="records of context shown around the divergence (default: 8)",
+    )
+    parser.add_argument(
+        "--lookahead",
+        type=int,
+        default=4096,
+        help="max records buffered while resynchronising across interrupts (default: 4096)",
+    )
+    parser.add_argument(
+        "--ignore",
+        default="",
+        help="comma-separated fields not to compare (e.g. 'mw,mb' for a reference "
+             "trace without memory writes)",
+    )
+    parser.add_argument("--keep-nops", action="store_true", help="compare NOP records too")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only set the exit status")
+
+    args = parser.parse_args()
+
+    files = []
+    for name in (args.trace_a, args.trace_b):
+        if name == "-":
+            files.append(sys.stdin)
+            continue
+        path = Path(name)
+        if not path.exists():
+            print(f"error: trace not found: {path}", file=sys.stderr)
+            sys.exit(2)
+        files.append(path.open())
+
+    try:
+        a = _Side(args.trace_a, read_records(files[0], args.keep_nops), args.context)
+        b = _Side(args.trace_b, read_records(files[1], args.keep_nops), args.context)
+        ignore = {f.strip().lower() for f in args.ignore.split(",") if f.strip()}
+        matched, div = compare(a, b, args.lookahead, ignore)
+        if div is None:
+            if not args.quiet:
+                print(f"traces match: {matched} records")
+            sys.exit(0)
+        if not args.quiet:
+            report(div, matched, a, b, args.context)
+        sys.exit(1)
+    finally:
+        for f in files:
+            if f is not sys.stdin:
+                f.close()
+
+
+if __name__ == "__main__":
+    main()